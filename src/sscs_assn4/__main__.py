@@ -5,10 +5,17 @@ Jess Ermi - je2230
 
 import argparse
 import base64
+import binascii
 import json
+from concurrent.futures import ThreadPoolExecutor
 import requests as r
 from cryptography.exceptions import InvalidSignature
-from .util import extract_public_key, verify_artifact_signature
+from .util import (
+    extract_public_key,
+    extract_cert_identities,
+    digest_artifact,
+    verify_artifact_digest,
+)
 from .merkle_proof import (
     DefaultHasher,
     verify_consistency,
@@ -16,26 +23,37 @@ from .merkle_proof import (
     compute_leaf_hash,
     RootMismatchError,
 )
+from .proof_store import ProofStore
+from .witness import Witness, serve, verify_cosignature
+from .watchlist import (
+    ScanOptions,
+    Watchlist,
+    extract_cert_der,
+    load_scan_position,
+    save_scan_position,
+)
 
 
 CONST_URL = "https://rekor.sigstore.dev/api/v1/log/"
+# number of log entries fetched per step of a watchlist scan
+SCAN_BATCH_SIZE = 64
 
 
-def get_log_entry(log_index, debug=False):
-    """fetches log entry from api given specific log index
+def fetch_log_entry(log_index, debug=False):
+    """fetches a raw log entry from api given specific log index
 
     Args:
         log_index (int): index of log entry in question
         debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
 
     Returns:
-        tuple: returns (signature, certificate) if no errors, false if errors
+        dict: returns the log entry (body, verification, ...) if no errors, false if errors
     """
 
     # verify that log index value is sane
     if not isinstance(log_index, int) or log_index <= 0:
         if debug:
-            print("In get_log_entry: index invalid")
+            print("In fetch_log_entry: index invalid")
         return False
 
     api_url = f"{CONST_URL}entries?logIndex={str(log_index)}"
@@ -44,111 +62,148 @@ def get_log_entry(log_index, debug=False):
     if res.status_code == 200:
         log_entry = res.json()
         key = list(log_entry.keys())[0]
+        return log_entry[key]
 
-        body = json.loads(base64.b64decode(log_entry[key]["body"].encode()).decode())
-        sign = body["spec"]["signature"]["content"]
+    if debug:
+        print("In fetch_log_entry: api call failed with code", res.status_code)
+    return False
 
-        b64_cert = body["spec"]["signature"]["publicKey"]["content"]
-        cert = base64.b64decode(b64_cert.encode()).decode()
 
-        if debug:
-            print("In get_log_entry:\n", "Signature: ", sign, "\nCert: ", cert)
+def parse_log_entry(entry, debug=False):
+    """extracts the signature and certificate from a fetched log entry
 
-        return (sign, cert)
+    Args:
+        entry (dict): log entry as returned by fetch_log_entry
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        tuple: returns (signature, certificate)
+    """
+
+    body = json.loads(base64.b64decode(entry["body"].encode()).decode())
+    sign = body["spec"]["signature"]["content"]
+
+    b64_cert = body["spec"]["signature"]["publicKey"]["content"]
+    cert = base64.b64decode(b64_cert.encode()).decode()
 
     if debug:
-        print("In get_log_entry: api call failed with code", res.status_code)
-    return False
+        print("In parse_log_entry:\n", "Signature: ", sign, "\nCert: ", cert)
 
+    return (sign, cert)
 
-def get_verification_proof(log_index, debug=False):
-    """fetches verification proof from api for specific log entry given index
+
+def get_log_entry(log_index, debug=False):
+    """fetches log entry from api given specific log index
 
     Args:
         log_index (int): index of log entry in question
         debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
 
     Returns:
-        dict: returns verification proof as a dict if no errors, false if errors
+        tuple: returns (signature, certificate) if no errors, false if errors
     """
 
-    # verify that log index value is sane
-    if not isinstance(log_index, int) or log_index <= 0:
-        if debug:
-            print("In get_verification_proof: index invalid")
+    entry = fetch_log_entry(log_index, debug)
+    if not entry:
         return False
 
-    # get verification proof from api
-    api_url = f"{CONST_URL}entries?logIndex={str(log_index)}"
-    res = r.get(api_url, timeout=10)
+    return parse_log_entry(entry, debug)
 
-    if res.status_code == 200:
-        log_entry = res.json()
-        key = list(log_entry.keys())[0]
 
-        ver = log_entry[key]["verification"]["inclusionProof"]
+def parse_verification_proof(entry, debug=False):
+    """extracts the inclusion proof from a fetched log entry and adds its leaf hash
 
-        # compute leaf hash
-        log_entry_body = log_entry[key].get("body")
-        leaf_hash = compute_leaf_hash(log_entry_body)
-        ver["leafHash"] = leaf_hash
+    Args:
+        entry (dict): log entry as returned by fetch_log_entry
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
 
-        if debug:
-            print("In get_verification_proof:\nVer:", ver)
+    Returns:
+        dict: returns verification proof as a dict
+    """
+
+    ver = dict(entry["verification"]["inclusionProof"])
 
-        return ver
+    # compute leaf hash
+    ver["leafHash"] = compute_leaf_hash(entry.get("body"))
 
     if debug:
-        print(f"In get_verification_proof: api call failed with code {res.status_code}")
-    return False
+        print("In parse_verification_proof:\nVer:", ver)
 
+    return ver
 
-def inclusion(log_index, artifact_filepath, debug=False):
-    """verifies an artifact's signature, if it is included in rekor log
+
+def get_verification_proof(log_index, debug=False):
+    """fetches verification proof from api for specific log entry given index
 
     Args:
         log_index (int): index of log entry in question
-        artifact_filepath (str): path of artifact file to verify signature/inclusion of
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        dict: returns verification proof as a dict if no errors, false if errors
+    """
+
+    entry = fetch_log_entry(log_index, debug)
+    if not entry:
+        return False
+
+    return parse_verification_proof(entry, debug)
+
+
+def verify_fetched_entry(log_index, entry_future, digest_future, debug=False):
+    """final stage of inclusion: waits for the fetch and digest stages, then
+    verifies the signature and the inclusion proof of the entry
+
+    Args:
+        log_index (int): index of log entry in question
+        entry_future (Future): pending result of fetch_log_entry
+        digest_future (Future): pending result of digest_artifact
         debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
 
     Returns:
         bool: returns False if there are errors, else True
     """
 
-    # verify that log index and artifact filepath values are sane
-    # (log index verification happens in both helper functions)
     try:
-        with open(artifact_filepath, "rb") as art_file:
-            art_file.read()
+        digest = digest_future.result()
 
     except OSError as error:
         if debug:
-            print(
-                f"In inclusion: failed to read from {artifact_filepath} with exception {error}"
-            )
+            print(f"In inclusion: failed to read artifact for {log_index} with exception {error}")
 
         return False
 
-    sign, cert = get_log_entry(log_index, debug)
-    sign = base64.b64decode(sign.encode())
+    try:
+        entry = entry_future.result()
+
+    except r.RequestException as error:
+        print(f"In inclusion: failed to fetch log entry {log_index} - {error!r}")
+        entry = False
 
-    # extract_public_key(certificate)
-    pub_key = extract_public_key(cert.encode())
+    if not entry:
+        if debug:
+            print(f"In inclusion: could not fetch log entry {log_index}")
+        return False
 
-    # verify_artifact_signature(signature, public_key, artifact_filepath)
+    # verify_artifact_digest(signature, public_key, digest)
     try:
-        verify_artifact_signature(sign, pub_key, artifact_filepath)
-        print("Signature is valid")
+        sign, cert = parse_log_entry(entry, debug)
+        sign = base64.b64decode(sign.encode())
 
-    except InvalidSignature as error:
-        if debug:
-            print(f"In inclusion: error verifying signature - {error}")
+        # extract_public_key(certificate)
+        pub_key = extract_public_key(cert.encode())
 
-    # get_verification_proof(log_index)
-    ver_map = get_verification_proof(log_index, debug)
+        verify_artifact_digest(sign, pub_key, digest)
+        print("Signature is valid")
 
+    except (InvalidSignature, ValueError, KeyError) as error:
+        print(f"In inclusion: error verifying signature of {log_index} - {error!r}")
+        return False
+
+    # the inclusion proof comes from the same entry, no second round trip needed
     # verify_inclusion(DefaultHasher, index, tree_size, leaf_hash, hashes, root_hash)
     try:
+        ver_map = parse_verification_proof(entry, debug)
         verify_inclusion(
             DefaultHasher,
             ver_map["logIndex"],
@@ -162,15 +217,113 @@ def inclusion(log_index, artifact_filepath, debug=False):
 
         return True
 
-    except ValueError as error:
-        print(f"In inclusion: Failed to verify inclusion with exception {error}")
+    except KeyError as error:
+        print(f"In inclusion: log entry {log_index} has no inclusion proof - {error!r}")
         return False
 
-    except RootMismatchError as error:
+    except (ValueError, RootMismatchError) as error:
         print(f"In inclusion: Failed to verify inclusion with exception {error}")
         return False
 
 
+def inclusion(log_index, artifact_filepath, debug=False):
+    """verifies an artifact's signature, if it is included in rekor log
+
+    The log entry is fetched while the artifact is being digested, so the
+    rekor round trip and the hashing of the artifact overlap.
+
+    Args:
+        log_index (int): index of log entry in question
+        artifact_filepath (str): path of artifact file to verify signature/inclusion of
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        bool: returns False if there are errors, else True
+    """
+
+    # verify that artifact filepath value is sane
+    # (log index verification happens in fetch_log_entry)
+    if not artifact_filepath:
+        if debug:
+            print("In inclusion: no artifact filepath given")
+        return False
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        entry_future = pool.submit(fetch_log_entry, log_index, debug)
+        digest_future = pool.submit(digest_artifact, artifact_filepath)
+
+        return verify_fetched_entry(log_index, entry_future, digest_future, debug)
+
+
+def inclusion_batch(items, debug=False):
+    """verifies signature and inclusion for several (log index, artifact) pairs
+
+    Fetches run one after another on a network worker and digests on a cpu
+    worker, so item N is hashed while item N+1 is being fetched and the total
+    time approaches max(network, cpu) instead of their sum.
+
+    Args:
+        items (list): list of (log_index, artifact_filepath) tuples
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        list: one bool per item, False if there were errors for that item
+    """
+
+    results = []
+    with ThreadPoolExecutor(max_workers=1) as net_pool, ThreadPoolExecutor(
+        max_workers=1
+    ) as cpu_pool:
+        entry_futures = [
+            net_pool.submit(fetch_log_entry, log_index, debug)
+            for log_index, _ in items
+        ]
+        digest_futures = [
+            cpu_pool.submit(digest_artifact, artifact_filepath)
+            for _, artifact_filepath in items
+        ]
+
+        for (log_index, _), entry_future, digest_future in zip(
+            items, entry_futures, digest_futures
+        ):
+            results.append(
+                verify_fetched_entry(log_index, entry_future, digest_future, debug)
+            )
+
+    return results
+
+
+def read_batch_file(batch_filepath, debug=False):
+    """reads a batch file with one "LOG_INDEX ARTIFACT_FILEPATH" pair per line
+
+    Args:
+        batch_filepath (str): path of the batch file
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        list: list of (log_index, artifact_filepath) tuples, false if errors
+    """
+
+    items = []
+    try:
+        with open(batch_filepath, "r", encoding="utf-8") as batch_file:
+            for line in batch_file:
+                fields = line.split(maxsplit=1)
+                if not fields:
+                    continue
+                if len(fields) != 2:
+                    print(f"In read_batch_file: malformed line {line.strip()!r}")
+                    return False
+                items.append((int(fields[0]), fields[1].strip()))
+
+    except (OSError, ValueError) as error:
+        if debug:
+            print(f"In read_batch_file: failed to read {batch_filepath} with exception {error}")
+        return False
+
+    return items
+
+
 def get_latest_checkpoint(debug=False):
     """fetches latest checkpoint from rekor api
 
@@ -191,12 +344,166 @@ def get_latest_checkpoint(debug=False):
     return False
 
 
-def consistency(prev_checkpoint, debug=False):
+def get_consistency_proof(first_size, last_size, tree_id, debug=False):
+    """fetches a consistency proof between two tree sizes from rekor api
+
+    Args:
+        first_size (int): size of the older tree
+        last_size (int): size of the newer tree
+        tree_id (str): id of the tree both sizes belong to
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        list: returns the proof hashes (hex strings) if no errors, else returns false
+    """
+
+    url = f"{CONST_URL}proof?firstSize={first_size}&lastSize={last_size}&treeID={tree_id}"
+    res = r.get(url, timeout=10)
+
+    if res.status_code == 200:
+        return res.json()["hashes"]
+
+    if debug:
+        print(f"In get_consistency_proof: API call failed with code {res.status_code}")
+    return False
+
+
+def get_witnessed_checkpoint(witness_url, public_key_path, debug=False):
+    """fetches the latest checkpoint from a local witness and checks its cosignature
+
+    Args:
+        witness_url (str): base url of the witness, e.g. http://127.0.0.1:8080
+        public_key_path (str): path of the witness public key (PEM)
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        dict: returns the cosigned checkpoint if no errors, else returns false
+    """
+
+    try:
+        res = r.get(f"{witness_url.rstrip('/')}/checkpoint", timeout=10)
+
+    except r.RequestException as error:
+        print(f"In get_witnessed_checkpoint: witness unreachable - {error!r}")
+        return False
+
+    if res.status_code != 200:
+        if debug:
+            print(f"In get_witnessed_checkpoint: API call failed with code {res.status_code}")
+        return False
+
+    # a bad PEM or body raises ValueError, a bad cosignature binascii.Error
+    try:
+        checkpoint = res.json()
+        with open(public_key_path, "rb") as key_file:
+            verify_cosignature(checkpoint, key_file.read())
+
+    except (
+        OSError,
+        KeyError,
+        TypeError,
+        ValueError,
+        binascii.Error,
+        InvalidSignature,
+    ) as error:
+        print(f"In get_witnessed_checkpoint: invalid cosignature - {error!r}")
+        return False
+
+    return checkpoint
+
+
+def get_witnessed_consistency_proof(witness_url, first_size, checkpoint, debug=False):
+    """fetches the consistency proof from first_size to a witnessed checkpoint
+    from the witness cache instead of rekor
+
+    Args:
+        witness_url (str): base url of the witness, e.g. http://127.0.0.1:8080
+        first_size (int): size of the older tree
+        checkpoint (dict): checkpoint returned by get_witnessed_checkpoint
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        list: returns the proof hashes (hex strings) if no errors, else returns false
+    """
+
+    url = f"{witness_url.rstrip('/')}/proof?firstSize={first_size}"
+    try:
+        res = r.get(url, timeout=10)
+
+    except r.RequestException as error:
+        print(f"In get_witnessed_consistency_proof: witness unreachable - {error!r}")
+        return False
+
+    if res.status_code != 200:
+        if debug:
+            print(f"In get_witnessed_consistency_proof: API call failed with code {res.status_code}")
+        return False
+
+    try:
+        proof = res.json()
+        last_size, hashes = proof["lastSize"], proof["hashes"]
+
+    except (KeyError, TypeError, ValueError) as error:
+        print(f"In get_witnessed_consistency_proof: malformed proof - {error!r}")
+        return False
+
+    # the witness may have moved to a newer head since the checkpoint was fetched
+    if last_size != checkpoint["treeSize"]:
+        print("In get_witnessed_consistency_proof: witness head changed, please retry")
+        return False
+
+    return hashes
+
+
+def get_trusted_checkpoint(witness_opts=None, debug=False):
+    """fetches the latest checkpoint from rekor, or from a local witness
+
+    Args:
+        witness_opts (tuple, optional): (witness url, witness public key path). Defaults to rekor.
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        dict: returns the checkpoint if no errors, else returns false
+    """
+
+    if witness_opts:
+        return get_witnessed_checkpoint(witness_opts[0], witness_opts[1], debug)
+    return get_latest_checkpoint(debug)
+
+
+def witness(key_path, state_path, port, interval, debug=False):
+    """runs a checkpoint witness: follows the latest checkpoint, verifies it
+    against the persisted head, cosigns it and serves it to local monitors
+
+    Args:
+        key_path (str): path of the witness signing key, created if missing
+        state_path (str): path of the file the witnessed head is persisted in
+        port (int): local port to serve on
+        interval (int): seconds between checkpoint polls
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        none: runs until interrupted
+    """
+
+    def get_proof(first_size, last_size, tree_id):
+        return get_consistency_proof(first_size, last_size, tree_id, debug)
+
+    cosigner = Witness(
+        key_path, state_path, lambda: get_latest_checkpoint(debug), get_proof, debug
+    )
+    print(f"Witness serving on http://127.0.0.1:{port}")
+    serve(cosigner, port=port, interval=interval)
+
+
+def consistency(prev_checkpoint, debug=False, witness_opts=None):
     """verifies an old rekor checkpoint is consistent with the newest checkpoint
 
     Args:
         prev_checkpoint (dict): dictionary holding tree id, tree size, root hash
         debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+        witness_opts (tuple, optional): (witness url, witness public key path) to get
+            the checkpoint and proof from a local witness. Defaults to rekor.
 
     Returns:
         bool: returns False if there are errors, else True
@@ -212,23 +519,29 @@ def consistency(prev_checkpoint, debug=False):
     tree_id = str(prev_checkpoint["treeID"])
 
     # get_latest_checkpoint()
-    new_proof = get_latest_checkpoint()
+    new_proof = get_trusted_checkpoint(witness_opts, debug)
 
     if new_proof:
         try:
             new_size = new_proof["treeSize"]
 
-            url = f"{CONST_URL}proof?firstSize={tree_size}&lastSize={new_size}&treeID={tree_id}"
-            res = r.get(url, timeout=10)
-
-            if res.status_code == 200:
-                old_proof = res.json()
+            if witness_opts and str(new_proof["treeID"]) != tree_id:
+                # a checkpoint of another shard would only fail as a root mismatch
+                print(f"In consistency: witness follows tree {new_proof['treeID']}, not {tree_id}")
+                hashes = False
+            elif witness_opts:
+                hashes = get_witnessed_consistency_proof(
+                    witness_opts[0], tree_size, new_proof, debug
+                )
+            else:
+                hashes = get_consistency_proof(tree_size, new_size, tree_id, debug)
 
+            if hashes is not False:
                 verify_consistency(
                     DefaultHasher,
                     prev_checkpoint["treeSize"],
                     new_proof["treeSize"],
-                    old_proof["hashes"],
+                    hashes,
                     prev_checkpoint["rootHash"],
                     new_proof["rootHash"],
                 )
@@ -237,25 +550,171 @@ def consistency(prev_checkpoint, debug=False):
 
             return False
 
-        except ValueError as error:
-            print(f"In inclusion: Failed to verify inclusion with exception {error}")
-            return False
-
-        except RootMismatchError as error:
+        except (ValueError, RootMismatchError) as error:
             print(f"In inclusion: Failed to verify inclusion with exception {error}")
             return False
 
     return False
 
 
-def main():
-    """main functiuon: parses command line arguments, calls correct functions
+def refresh_proofs(store, watch_indices=(), debug=False, witness_opts=None):
+    """moves the inclusion proofs in a proof store to the latest checkpoint
+
+    Proofs are rewritten from one consistency proof per stored tree size,
+    only watched indices without a usable proof are fetched again.
+
+    Args:
+        store (ProofStore): store holding the verified inclusion proofs
+        watch_indices (iterable, optional): log indices to add to the store if missing
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+        witness_opts (tuple, optional): (witness url, witness public key path) to get
+            the checkpoint and consistency proofs from a local witness. Defaults to rekor.
 
     Returns:
-        none: program exits after execution
+        bool: returns False if there are errors, else True
+    """
+
+    checkpoint = get_trusted_checkpoint(witness_opts, debug)
+    if not checkpoint:
+        return False
+
+    def get_proof(first_size):
+        if witness_opts:
+            return get_witnessed_consistency_proof(
+                witness_opts[0], first_size, checkpoint, debug
+            )
+        return get_consistency_proof(
+            first_size, checkpoint["treeSize"], checkpoint["treeID"], debug
+        )
+
+    stale = store.advance(
+        checkpoint["treeSize"], checkpoint["rootHash"], get_proof, debug
+    )
+    missing = sorted(
+        (store.stale | set(watch_indices)) - set(store.proofs) - set(stale)
+    )
+    if debug:
+        print(f"In refresh_proofs: {len(stale)} stale, {len(missing)} new proofs to fetch")
+
+    ok = True
+    for log_index in stale + missing:
+        ver_map = get_verification_proof(log_index, debug)
+        if not ver_map:
+            ok = False
+            continue
+
+        try:
+            store.add(log_index, ver_map)
+
+        except (ValueError, RootMismatchError) as error:
+            print(f"In refresh_proofs: Failed to verify inclusion of {log_index} with exception {error}")
+            ok = False
+
+    return ok
+
+
+def match_scan_batch(pool, watchlist, start, entries, debug=False):
+    """matches a batch of fetched entries against a watchlist
+
+    Entries are matched on the raw certificate bytes, only the ones that
+    match are parsed, in parallel on the pool. The pool must not be the one
+    entries are fetched on, or the parses queue behind the next batch.
+
+    Args:
+        pool (ThreadPoolExecutor): pool the candidate certificates are parsed on
+        watchlist (Watchlist): identities to look for
+        start (int): log index of the first entry in the batch
+        entries (list): log entries as returned by fetch_log_entry
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        list: (log index, identity) pairs for every match
+    """
+
+    candidates = {}
+    for n, entry in enumerate(entries):
+        der = extract_cert_der(entry.get("body"))
+        if watchlist.is_candidate(der):
+            candidates[start + n] = pool.submit(extract_cert_identities, der)
+
+    alerts = []
+    for log_index, future in candidates.items():
+        try:
+            found = watchlist.matches(future.result())
+
+        except ValueError as error:
+            if debug:
+                print(f"In scan_watchlist: failed to parse cert of {log_index} with exception {error}")
+            continue
+
+        for identity in sorted(found):
+            print(f"Watched identity {identity} found in log entry {log_index}")
+            alerts.append((log_index, identity))
+
+    if debug:
+        print(f"In scan_watchlist: {len(candidates)} candidates from {start}")
+    return alerts
+
+
+def scan_watchlist(identities, options, debug=False):
+    """scans log entries for certificates issued to watched identities
+
+    Entries are fetched in parallel and matched with match_scan_batch while
+    the next batch is being fetched. Candidates are parsed on their own pool,
+    so alerts and the saved position do not wait for the next batch's round
+    trips. The scan position is saved after every batch, so a restarted scan
+    resumes where it stopped.
+
+    Args:
+        identities (list): SAN emails or OIDC subjects to look for
+        options (ScanOptions): where to start and stop, state file and worker count
+        debug (bool, optional): if true, prints verbose output to terminal. Defaults to False.
+
+    Returns:
+        list: (log index, identity) pairs for every match
+    """
+
+    watchlist = Watchlist(identities)
+    start = options.start
+    if options.state_path:
+        start = load_scan_position(options.state_path, start)
+
+    def submit_batch(pool, first):
+        last = first + SCAN_BATCH_SIZE
+        if options.end is not None:
+            last = min(last, options.end)
+        return [pool.submit(fetch_log_entry, i, debug) for i in range(first, last)]
+
+    alerts = []
+    with ThreadPoolExecutor(
+        max_workers=options.workers
+    ) as pool, ThreadPoolExecutor(max_workers=options.workers) as parse_pool:
+        batch = submit_batch(pool, start)
+        while batch:
+            entries = [future.result() for future in batch]
+
+            # a failed fetch (usually past the end of the log) ends the scan there
+            fetched = next((n for n, e in enumerate(entries) if not e), len(entries))
+            batch = submit_batch(pool, start + fetched) if fetched == len(entries) else []
+
+            alerts.extend(
+                match_scan_batch(parse_pool, watchlist, start, entries[:fetched], debug)
+            )
+
+            start += fetched
+            if options.state_path:
+                save_scan_position(options.state_path, start)
+
+    return alerts
+
+
+def build_parser():
+    """builds the command line parser
+
+    Returns:
+        ArgumentParser: parser for every mode of the monitor
     """
 
-    debug = False
     parser = argparse.ArgumentParser(description="Rekor Verifier")
     parser.add_argument(
         "-d", "--debug", help="Debug mode", required=False, action="store_true"
@@ -283,6 +742,90 @@ def main():
                         signature",
         required=False,
     )
+    parser.add_argument(
+        "--batch",
+        help="Verify inclusion of several entries.\
+                        File with one LOG_INDEX ARTIFACT_FILEPATH pair per line.",
+        required=False,
+    )
+    parser.add_argument(
+        "--proof-store",
+        help="File holding verified inclusion proofs.\
+                        Moves them to the latest checkpoint.",
+        required=False,
+    )
+    parser.add_argument(
+        "--watch-index",
+        help="Log index to keep an inclusion proof for in\
+                        the proof store. Can be given more than once.",
+        required=False,
+        type=int,
+        action="append",
+        default=[],
+    )
+    parser.add_argument(
+        "--watch-identity",
+        help="SAN email or OIDC subject to scan the log for.\
+                        Can be given more than once.",
+        required=False,
+        action="append",
+        default=[],
+    )
+    parser.add_argument(
+        "--scan-from", help="First log index to scan", required=False, type=int
+    )
+    parser.add_argument(
+        "--scan-to", help="Log index to stop scanning before", required=False, type=int
+    )
+    parser.add_argument(
+        "--scan-state",
+        help="File the scan position is saved in,\
+                        a restarted scan resumes from it.",
+        required=False,
+    )
+    parser.add_argument(
+        "--witness",
+        help="Run a checkpoint witness serving cosigned\
+                        checkpoints to local monitors.",
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--witness-key",
+        help="Witness signing key (created if missing)",
+        required=False,
+        default="witness_key.pem",
+    )
+    parser.add_argument(
+        "--witness-state",
+        help="File the witnessed head is persisted in",
+        required=False,
+        default="witness_state.json",
+    )
+    parser.add_argument(
+        "--witness-port",
+        help="Port the witness serves on",
+        required=False,
+        type=int,
+        default=8080,
+    )
+    parser.add_argument(
+        "--witness-interval",
+        help="Seconds between checkpoint polls of the witness",
+        required=False,
+        type=int,
+        default=60,
+    )
+    parser.add_argument(
+        "--witness-url",
+        help="Get checkpoints and consistency proofs from a local\
+                        witness instead of rekor (-c, --consistency,\
+                        --proof-store). Needs --witness-pubkey.",
+        required=False,
+    )
+    parser.add_argument(
+        "--witness-pubkey", help="Public key (PEM) of the witness", required=False
+    )
     parser.add_argument(
         "--consistency",
         help="Verify consistency of a given\
@@ -298,34 +841,157 @@ def main():
     parser.add_argument(
         "--root-hash", help="Root hash for consistency proof", required=False
     )
-    args = parser.parse_args()
+    return parser
+
+
+def witness_options(args):
+    """--witness-url/--witness-pubkey as passed to the checkpoint consumers
+
+    Returns:
+        tuple: (witness url, public key path), None to use rekor, False if the key is missing
+    """
+
+    if not args.witness_url:
+        return None
+    if not args.witness_pubkey:
+        print("please specify the witness public key")
+        return False
+    return (args.witness_url, args.witness_pubkey)
+
+
+def run_checkpoint(args, debug=False):
+    """-c: prints the latest checkpoint, from rekor or from a local witness"""
+
+    witness_opts = witness_options(args)
+    if witness_opts is False:
+        return False
+
+    # get and print latest checkpoint from server
+    checkpoint = get_trusted_checkpoint(witness_opts, debug)
+    print(json.dumps(checkpoint, indent=4))
+    return True
+
+
+def run_inclusion(args, debug=False):
+    """--inclusion: verifies signature and inclusion of one artifact"""
+
+    inclusion(args.inclusion, args.artifact, debug)
+    return True
+
+
+def run_batch(args, debug=False):
+    """--batch: verifies signature and inclusion of every artifact in a batch file"""
+
+    items = read_batch_file(args.batch, debug)
+    if items:
+        for (log_index, _), ok in zip(items, inclusion_batch(items, debug)):
+            print(f"{log_index}: {'verified' if ok else 'failed'}")
+    return True
+
+
+def run_proof_store(args, debug=False):
+    """--proof-store: moves stored inclusion proofs to the latest checkpoint"""
+
+    witness_opts = witness_options(args)
+    if witness_opts is False:
+        return False
+
+    try:
+        store = ProofStore.load(args.proof_store, debug=debug)
+
+    except FileNotFoundError:
+        store = ProofStore()
+
+    refresh_proofs(store, args.watch_index, debug, witness_opts)
+    store.save(args.proof_store)
+    sizes = sorted({size for size, _ in store.heads()})
+    print(f"{len(store)} inclusion proofs at tree sizes {sizes}")
+    return True
+
+
+def run_watchlist(args, debug=False):
+    """--watch-identity: scans the log for certificates of watched identities"""
+
+    if args.scan_from is None and not args.scan_state:
+        print("please specify --scan-from or --scan-state to scan from")
+        return False
+
+    options = ScanOptions(args.scan_from, args.scan_to, args.scan_state)
+    if options.start is None and load_scan_position(args.scan_state, None) is None:
+        print("please specify --scan-from, there is no saved scan position")
+        return False
+
+    scan_watchlist(args.watch_identity, options, debug)
+    return True
+
+
+def run_consistency(args, debug=False):
+    """--consistency: verifies a previous checkpoint against the latest one"""
+
+    witness_opts = witness_options(args)
+    if witness_opts is False:
+        return False
+    if not args.tree_id:
+        print("please specify tree id for prev checkpoint")
+        return False
+    if not args.tree_size:
+        print("please specify tree size for prev checkpoint")
+        return False
+    if not args.root_hash:
+        print("please specify root hash for prev checkpoint")
+        return False
+
+    prev_checkpoint = {}
+    prev_checkpoint["treeID"] = args.tree_id
+    prev_checkpoint["treeSize"] = args.tree_size
+    prev_checkpoint["rootHash"] = args.root_hash
+
+    consistency(prev_checkpoint, debug, witness_opts)
+    return True
+
+
+def run_witness(args, debug=False):
+    """--witness: runs the checkpoint witness until interrupted"""
+
+    witness(
+        args.witness_key,
+        args.witness_state,
+        args.witness_port,
+        args.witness_interval,
+        debug,
+    )
+    return True
+
+
+# modes in the order they run, a mode returns False when its arguments are
+# incomplete, which stops the modes after it
+MODES = [
+    ("checkpoint", run_checkpoint),
+    ("inclusion", run_inclusion),
+    ("batch", run_batch),
+    ("proof_store", run_proof_store),
+    ("watch_identity", run_watchlist),
+    ("consistency", run_consistency),
+    ("witness", run_witness),
+]
+
+
+def main():
+    """main functiuon: parses command line arguments, calls correct functions
+
+    Returns:
+        none: program exits after execution
+    """
+
+    debug = False
+    args = build_parser().parse_args()
     if args.debug:
         debug = True
         print("enabled debug mode")
-    if args.checkpoint:
-        # get and print latest checkpoint from server
-        # if debug is enabled, store it in a file checkpoint.json
-        checkpoint = get_latest_checkpoint(debug)
-        print(json.dumps(checkpoint, indent=4))
-    if args.inclusion:
-        inclusion(args.inclusion, args.artifact, debug)
-    if args.consistency:
-        if not args.tree_id:
-            print("please specify tree id for prev checkpoint")
-            return
-        if not args.tree_size:
-            print("please specify tree size for prev checkpoint")
-            return
-        if not args.root_hash:
-            print("please specify root hash for prev checkpoint")
-            return
 
-        prev_checkpoint = {}
-        prev_checkpoint["treeID"] = args.tree_id
-        prev_checkpoint["treeSize"] = args.tree_size
-        prev_checkpoint["rootHash"] = args.root_hash
-
-        consistency(prev_checkpoint, debug)
+    for mode, handler in MODES:
+        if getattr(args, mode) and not handler(args, debug):
+            return
 
 
 if __name__ == "__main__":
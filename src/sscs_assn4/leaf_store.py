@@ -0,0 +1,364 @@
+"""Append-only, memory-mapped store of fixed-width leaf hashes
+
+The store is two files:
+    PATH      header + leaf hashes back to back, leaf i at HEADER + i * digest_size
+    PATH.idx  open addressing hash table mapping a leaf hash to its index
+
+Opening either file only maps it, so it costs the same for ten leaves or ten
+million. There is a single writer; any number of readers can map the files
+while it appends and pick up new leaves with refresh().
+
+Neither file is ever replaced or shrunk while the store is open, because
+Windows refuses both for a file another process has open or mapped. When the
+table fills up the writer grows PATH.idx in place and rebuilds it there. The
+generation in its header is odd during a rebuild, readers fall back to a scan
+of the leaves then, and remap the table on their next lookup or refresh()
+once it has grown. A reader that never looks anything up keeps its old
+mapping, which is harmless, so readers only need refresh() to see new leaves.
+"""
+
+import mmap
+import os
+import struct
+
+from .merkle_proof import DefaultHasher
+
+DATA_MAGIC = b"SSCSLEAF"
+INDEX_MAGIC = b"SSCSLIDX"
+
+# magic, digest size
+DATA_HEADER = struct.Struct("<8sI4x")
+# magic, generation (odd while the table is rebuilt), number of slots,
+# number of leaves inserted into the table
+INDEX_HEADER = struct.Struct("<8sQQQ")
+# a slot holds index + 1, 0 marks an empty slot
+SLOT = struct.Struct("<Q")
+
+MIN_SLOTS = 1024
+DEFAULT_DIGEST_SIZE = DefaultHasher.size()
+
+
+class LeafStore:
+    # The file handles below stay open for as long as their mappings (and the
+    # writer's append handle) are in use, so they cannot be context managers;
+    # close() releases all of them.
+
+    def __init__(self, path, digest_size=DEFAULT_DIGEST_SIZE, readonly=False):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.digest_size = digest_size
+        self.readonly = readonly
+
+        self._data_file = None
+        self._data = None
+        self._append_file = None
+        # leaves on disk (for the writer) and leaves covered by the mapping,
+        # the writer only remaps when it reads a leaf past the mapping
+        self._count = 0
+        self._mapped = 0
+        self._index_file = None
+        self._index = None
+        self._slots = 0
+
+        if not readonly:
+            self._init_files()
+        self._map_data()
+        self._map_index()
+        if not readonly:
+            self._append_file = open(self.path, "ab", buffering=0)  # noqa: SIM115
+            self._catch_up_index()
+
+    def _init_files(self):
+        if (
+            not os.path.exists(self.path)
+            or os.path.getsize(self.path) < DATA_HEADER.size
+        ):
+            # new store, or a crash happened before the header was written
+            with open(self.path, "wb") as f:
+                f.write(DATA_HEADER.pack(DATA_MAGIC, self.digest_size))
+        else:
+            # drop a partially written record left behind by a crashed writer
+            size = os.path.getsize(self.path)
+            whole = (size - DATA_HEADER.size) // self.digest_size
+            if size != DATA_HEADER.size + whole * self.digest_size:
+                os.truncate(self.path, DATA_HEADER.size + whole * self.digest_size)
+
+        if not os.path.exists(self.index_path):
+            with open(self.index_path, "wb") as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, 0, MIN_SLOTS, 0))
+                f.write(bytes(MIN_SLOTS * SLOT.size))
+
+    def _map_data(self):
+        if self._data is not None:
+            self._data.close()
+            self._data_file.close()
+
+        self._data_file = open(self.path, "rb")  # noqa: SIM115
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, digest_size = DATA_HEADER.unpack_from(self._data, 0)
+        if magic != DATA_MAGIC:
+            raise ValueError(f"{self.path} is not a leaf store")
+        if digest_size != self.digest_size:
+            raise ValueError(
+                f"{self.path} holds {digest_size} byte digests, want {self.digest_size}"
+            )
+        self._mapped = (len(self._data) - DATA_HEADER.size) // self.digest_size
+        self._count = max(self._count, self._mapped)
+
+    def _map_index(self):
+        if self._index is not None:
+            self._index.close()
+            self._index_file.close()
+
+        if self.readonly:
+            self._index_file = open(self.index_path, "rb")  # noqa: SIM115
+            self._index = mmap.mmap(
+                self._index_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        else:
+            self._index_file = open(self.index_path, "r+b")  # noqa: SIM115
+            self._index = mmap.mmap(self._index_file.fileno(), 0)
+
+        magic, _, self._slots, _ = INDEX_HEADER.unpack_from(self._index, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{self.index_path} is not a leaf store index")
+
+    def _index_header(self):
+        """generation, number of slots and leaves covered of the table,
+        remapping it first if the writer has grown it
+        """
+        _, generation, slots, covered = INDEX_HEADER.unpack_from(self._index, 0)
+        if slots != self._slots:
+            self._map_index()
+            _, generation, slots, covered = INDEX_HEADER.unpack_from(self._index, 0)
+        return generation, slots, covered
+
+    def _slot_of(self, digest, slots):
+        return int.from_bytes(digest[:8], "little") & (slots - 1)
+
+    def _insert_slot(self, table, base, slots, digest, index):
+        slot = self._slot_of(digest, slots)
+        while True:
+            off = base + slot * SLOT.size
+            (value,) = SLOT.unpack_from(table, off)
+            if value == 0:
+                SLOT.pack_into(table, off, index + 1)
+                return
+            # keep the first index for a repeated leaf hash
+            if self._read(value - 1) == digest:
+                return
+            slot = (slot + 1) & (slots - 1)
+
+    def _catch_up_index(self):
+        generation, _, covered = self._index_header()
+        if generation & 1 or covered > self._count:
+            # a rebuild was cut short, or the table is ahead of the data file
+            self._rebuild_index()
+            return
+        for i in range(covered, self._count):
+            self._index_leaf(self._read(i), i)
+
+    def _rebuild_index(self):
+        # keep the table at most half full so probe chains stay short
+        slots = max(self._slots, MIN_SLOTS)
+        while slots < 2 * self._count:
+            slots *= 2
+
+        # an odd generation tells readers not to trust the table until it is done
+        generation, _, _ = self._index_header()
+        generation |= 1
+        INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, generation, self._slots, 0)
+
+        size = INDEX_HEADER.size + slots * SLOT.size
+        if size > len(self._index):
+            # grow the file by appending to it, with our own mapping closed
+            self._index.close()
+            self._index_file.close()
+            self._index = None
+            with open(self.index_path, "ab") as f:
+                f.write(bytes(size - os.path.getsize(self.index_path)))
+            self._map_index()
+
+        table = bytearray(slots * SLOT.size)
+        for i, digest in enumerate(self):
+            self._insert_slot(table, 0, slots, digest, i)
+        self._index[INDEX_HEADER.size : size] = table
+        INDEX_HEADER.pack_into(
+            self._index, 0, INDEX_MAGIC, generation + 1, slots, self._count
+        )
+        self._slots = slots
+
+    def _index_leaf(self, digest, index):
+        generation, _, covered = self._index_header()
+        if covered > index:
+            return
+        if (index + 1) * 2 > self._slots:
+            # the rebuilt table covers every leaf mapped so far
+            self._rebuild_index()
+            return
+        self._insert_slot(self._index, INDEX_HEADER.size, self._slots, digest, index)
+        INDEX_HEADER.pack_into(
+            self._index, 0, INDEX_MAGIC, generation, self._slots, index + 1
+        )
+
+    def _read(self, index):
+        if index >= self._mapped:
+            self._map_data()
+        off = DATA_HEADER.size + index * self.digest_size
+        return self._data[off : off + self.digest_size]
+
+    def refresh(self):
+        """remaps the files to pick up leaves appended by the writer"""
+        if os.path.getsize(self.path) > len(self._data):
+            self._map_data()
+        self._index_header()
+
+    def append(self, digest):
+        """appends a leaf hash and returns its index"""
+        if self.readonly:
+            raise ValueError(f"{self.path} is opened read only")
+        if len(digest) != self.digest_size:
+            raise ValueError(
+                f"leaf hash has unexpected size {len(digest)}, want {self.digest_size}"
+            )
+
+        # data goes to disk before the table points at it
+        self._append_file.write(digest)
+        index = self._count
+        self._count += 1
+        self._index_leaf(bytes(digest), index)
+        return index
+
+    def extend(self, digests):
+        """appends several leaf hashes with a single write, the bulk path for
+        loading many leaves at once
+        """
+        if self.readonly:
+            raise ValueError(f"{self.path} is opened read only")
+        digests = [bytes(d) for d in digests]
+        for digest in digests:
+            if len(digest) != self.digest_size:
+                raise ValueError(
+                    f"leaf hash has unexpected size {len(digest)}, want {self.digest_size}"
+                )
+
+        self._append_file.write(b"".join(digests))
+        start = self._count
+        self._count += len(digests)
+        for i, digest in enumerate(digests):
+            self._index_leaf(digest, start + i)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            self.refresh()
+            if not 0 <= index < self._count:
+                raise IndexError(f"leaf index {index} out of range")
+        return self._read(index)
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._read(i)
+
+    def __contains__(self, digest):
+        return self.index_of(digest) is not None
+
+    def index_of(self, digest):
+        """returns the index of a leaf hash, None if it is not in the store"""
+        digest = bytes(digest)
+        if len(digest) != self.digest_size:
+            return None
+
+        while True:
+            generation, slots, _ = self._index_header()
+            if generation & 1:
+                # the writer is rebuilding the table
+                return next(
+                    (i for i in range(self._count) if self._read(i) == digest), None
+                )
+
+            found = self._probe(digest, slots)
+            # a match is checked against the data, a miss only counts if the
+            # table was not rebuilt under us
+            if found is not None or self._index_header()[0] == generation:
+                return found
+
+    def _probe(self, digest, slots):
+        slot = self._slot_of(digest, slots)
+        while True:
+            (value,) = SLOT.unpack_from(self._index, INDEX_HEADER.size + slot * SLOT.size)
+            if value == 0:
+                return None
+            # the table may point past our view of the data while a writer appends
+            if value - 1 < self._count and self._read(value - 1) == digest:
+                return value - 1
+            slot = (slot + 1) & (slots - 1)
+
+    def close(self):
+        for m in (self._data, self._index):
+            if m is not None:
+                m.close()
+        for f in (self._data_file, self._index_file, self._append_file):
+            if f is not None:
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def subtree_hash(self, hasher, start, end):
+        """RFC 6962 hash of the leaves [start, end), in a single pass"""
+        if start == end:
+            return hasher.empty_root()
+
+        # stack of (level, hash) for the complete subtrees seen so far
+        stack = []
+        for i in range(start, end):
+            node, level = self._read(i), 0
+            while stack and stack[-1][0] == level:
+                node = hasher.hash_children(stack.pop()[1], node)
+                level += 1
+            stack.append((level, node))
+
+        node = stack.pop()[1]
+        while stack:
+            node = hasher.hash_children(stack.pop()[1], node)
+        return node
+
+    def root(self, hasher=DefaultHasher, size=None):
+        """root hash of the tree made of the first size leaves"""
+        size = self._count if size is None else size
+        if size > self._count:
+            raise ValueError(f"size is beyond store: {size} > {self._count}")
+        return self.subtree_hash(hasher, 0, size)
+
+    def inclusion_proof(self, index, size=None, hasher=DefaultHasher):
+        """inclusion proof for leaf index in the tree of the first size leaves,
+        laid out the way root_from_inclusion_proof expects it
+        """
+        size = self._count if size is None else size
+        if size > self._count:
+            raise ValueError(f"size is beyond store: {size} > {self._count}")
+        if index >= size:
+            raise ValueError(f"index is beyond size: {index} >= {size}")
+
+        proof = []
+        inner = (index ^ (size - 1)).bit_length()
+        level = 0
+        while (index >> level) or level < inner:
+            if level >= inner and not (index >> level) & 1:
+                # right border, no sibling on this level
+                level += 1
+                continue
+            lo = ((index >> level) ^ 1) << level
+            hi = min(lo + (1 << level), size)
+            proof.append(self.subtree_hash(hasher, lo, hi))
+            level += 1
+        return proof
@@ -0,0 +1,231 @@
+"""Store of verified inclusion proofs that follows the log as it grows
+
+Instead of fetching a new inclusion proof for every watched entry each time
+the tree grows, the store verifies one consistency proof per stored tree
+size and rewrites the stored inclusion proofs to the new tree head.
+"""
+
+import json
+import os
+
+from .merkle_proof import (
+    DefaultHasher,
+    RootMismatchError,
+    decomp_incl_proof,
+    root_from_inclusion_proof,
+    verify_consistency,
+    verify_inclusion,
+    verify_match,
+)
+
+
+def advance_inclusion_proof(hasher, index, size1, proof, size2, consistency, root1):
+    """rewrites the inclusion proof of index in tree size1 for tree size2
+
+    The consistency proof from size1 to size2 is the path of leaf size1 - 1 in
+    tree size2, starting at the largest complete subtree ending at size1. Leaf
+    index shares that path above the level where it splits from leaf size1 - 1,
+    and below it the old proof still holds, so only the node at the split level
+    has to be hashed. All hashes are bytes, and the consistency proof must have
+    been verified already.
+    """
+    if index >= size1:
+        raise ValueError(f"index is beyond size: {index} >= {size1}")
+    if size1 == size2:
+        return list(proof)
+
+    last = size1 - 1
+    shift = (size1 & -size1).bit_length() - 1
+    inner, _ = decomp_incl_proof(last, size2)
+
+    if size1 == 1 << shift:
+        seed, rest = root1, consistency
+    else:
+        seed, rest = consistency[0], consistency[1:]
+
+    # siblings of the ancestors of leaf size1 - 1 in tree size2, from level
+    # shift up, None where the ancestor is on the right border with no sibling
+    path = list(rest[: inner - shift])
+    border = iter(rest[inner - shift :])
+    level = inner
+    while last >> level:
+        path.append(next(border) if (last >> level) & 1 else None)
+        level += 1
+
+    split = (index ^ last).bit_length()
+    if split <= shift:
+        # index sits in the complete subtree ending at size1
+        return list(proof[:shift]) + [h for h in path if h is not None]
+
+    # hash of the ancestor of leaf size1 - 1 right below the split, which is
+    # the sibling of the ancestor of index at that level
+    node = seed
+    for level in range(shift, split - 1):
+        h = path[level - shift]
+        if h is None:
+            continue
+        if (last >> level) & 1:
+            node = hasher.hash_children(h, node)
+        else:
+            node = hasher.hash_children(node, h)
+
+    return (
+        list(proof[: split - 1])
+        + [node]
+        + [h for h in path[split - shift :] if h is not None]
+    )
+
+
+class ProofStore:
+    def __init__(self, hasher=DefaultHasher):
+        self.hasher = hasher
+        # log index -> verification proof dict, as returned by get_verification_proof
+        self.proofs = {}
+        # log indices whose saved proof could not be loaded, to be fetched again
+        self.stale = set()
+
+    def add(self, log_index, ver_map):
+        """verifies an inclusion proof and keeps it for log_index
+
+        raises ValueError or RootMismatchError if the proof does not verify
+        """
+        verify_inclusion(
+            self.hasher,
+            ver_map["logIndex"],
+            ver_map["treeSize"],
+            ver_map["leafHash"],
+            ver_map["hashes"],
+            ver_map["rootHash"],
+        )
+        self.proofs[log_index] = dict(ver_map)
+        self.stale.discard(log_index)
+
+    def remove(self, log_index):
+        self.proofs.pop(log_index, None)
+
+    def __contains__(self, log_index):
+        return log_index in self.proofs
+
+    def __len__(self):
+        return len(self.proofs)
+
+    def heads(self):
+        """distinct (tree size, root hash) pairs the stored proofs are for"""
+        return {(v["treeSize"], v["rootHash"]) for v in self.proofs.values()}
+
+    def advance(self, tree_size, root_hash, get_consistency, debug=False):
+        """moves every stored proof to the tree head (tree_size, root_hash)
+
+        get_consistency(first_size) must return the consistency proof (hex
+        hashes) from first_size to tree_size, or False. It is called once per
+        distinct stored tree size, so once per update when all proofs are
+        already at the same head.
+
+        Returns:
+            list: log indices whose proofs could not be moved forward and
+            should be fetched again, their old proofs are left untouched
+        """
+        stale = []
+        new_root = bytes.fromhex(root_hash)
+
+        for size, old_root in sorted(self.heads()):
+            group = [
+                i
+                for i, v in self.proofs.items()
+                if v["treeSize"] == size and v["rootHash"] == old_root
+            ]
+
+            if size > tree_size:
+                # already ahead of the given head, nothing to do
+                continue
+
+            hashes = get_consistency(size) if size != tree_size else []
+            if hashes is False:
+                stale.extend(group)
+                continue
+
+            try:
+                verify_consistency(
+                    self.hasher, size, tree_size, hashes, old_root, root_hash
+                )
+            except (ValueError, RootMismatchError) as error:
+                if debug:
+                    print(f"In advance: consistency from {size} failed with exception {error}")
+                stale.extend(group)
+                continue
+
+            consistency = [bytes.fromhex(h) for h in hashes]
+            for log_index in group:
+                ver = self.proofs[log_index]
+                try:
+                    proof = advance_inclusion_proof(
+                        self.hasher,
+                        ver["logIndex"],
+                        size,
+                        [bytes.fromhex(h) for h in ver["hashes"]],
+                        tree_size,
+                        consistency,
+                        bytes.fromhex(old_root),
+                    )
+                    # the rewritten proof is checked like a fetched one would be
+                    calc_root = root_from_inclusion_proof(
+                        self.hasher,
+                        ver["logIndex"],
+                        tree_size,
+                        bytes.fromhex(ver["leafHash"]),
+                        proof,
+                    )
+                    verify_match(calc_root, new_root)
+                except (ValueError, RootMismatchError) as error:
+                    if debug:
+                        print(f"In advance: could not move proof for {log_index} - {error}")
+                    stale.append(log_index)
+                    continue
+
+                ver["treeSize"] = tree_size
+                ver["rootHash"] = root_hash
+                ver["hashes"] = [h.hex() for h in proof]
+                # the checkpoint note belongs to the old head
+                ver.pop("checkpoint", None)
+
+        return stale
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({str(i): v for i, v in self.proofs.items()}, f, indent=4)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, hasher=DefaultHasher, debug=False):
+        """loads a store saved with save(), verifying every proof again
+
+        Entries that are malformed or no longer verify are left out and put in
+        store.stale, so they get fetched again. A file that is not valid JSON
+        gives an empty store. raises FileNotFoundError if there is no file.
+        """
+        store = cls(hasher)
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                saved = json.load(f)
+            except ValueError as error:
+                print(f"In load: {path} is not a proof store - {error}")
+                return store
+
+        if not isinstance(saved, dict):
+            print(f"In load: {path} is not a proof store")
+            return store
+
+        for log_index, ver_map in saved.items():
+            try:
+                log_index = int(log_index)
+            except ValueError:
+                continue
+
+            try:
+                store.add(log_index, ver_map)
+            except (ValueError, KeyError, TypeError, RootMismatchError) as error:
+                if debug:
+                    print(f"In load: dropping proof for {log_index} - {error!r}")
+                store.stale.add(log_index)
+        return store
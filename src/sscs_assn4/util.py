@@ -1,9 +1,12 @@
+import hashlib
+
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
 
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
 from cryptography.hazmat.primitives.serialization import load_pem_public_key
 from cryptography.exceptions import InvalidSignature
 
@@ -34,25 +37,55 @@ def extract_public_key(cert):
     return pem_public_key
 
 
-def verify_artifact_signature(signature, public_key, artifact_filename):
-    # load the public key
-    # with open("cert_public.pem", "rb") as pub_key_file:
-    #    public_key = load_pem_public_key(pub_key_file.read())
+# returns the SAN emails and URIs (the OIDC identity for fulcio certs)
+# of a certificate in DER format
+def extract_cert_identities(cert):
+    certificate = x509.load_der_x509_certificate(cert)
+
+    try:
+        san = certificate.extensions.get_extension_for_class(
+            x509.SubjectAlternativeName
+        ).value
+    except x509.ExtensionNotFound:
+        return set()
+
+    identities = set(san.get_values_for_type(x509.RFC822Name))
+    identities.update(san.get_values_for_type(x509.UniformResourceIdentifier))
+    return identities
+
 
-    # load the signature
-    #    with open("hello.sig", "rb") as sig_file:
-    #        signature = sig_file.read()
+# size of the blocks read from disk when digesting an artifact
+ARTIFACT_CHUNK_SIZE = 1 << 20
 
-    public_key = load_pem_public_key(public_key)
-    # load the data to be verified
+
+# streams an artifact from disk and returns its sha256 digest (bytes)
+# hashlib releases the GIL on large updates, so this can run in a worker thread
+# while the rekor entry is being fetched
+def digest_artifact(artifact_filename, chunk_size=ARTIFACT_CHUNK_SIZE):
+    h = hashlib.sha256()
     with open(artifact_filename, "rb") as data_file:
-        data = data_file.read()
+        for chunk in iter(lambda: data_file.read(chunk_size), b""):
+            h.update(chunk)
+    return h.digest()
+
 
-    # verify the signature
+# verifies an ECDSA signature over an artifact given its precomputed sha256
+# digest, so the artifact does not have to be read again
+# raises InvalidSignature for a bad signature, and also for a key or signature
+# that cannot be used at all, so a caller never mistakes those for valid
+def verify_artifact_digest(signature, public_key, digest):
     try:
-        public_key.verify(signature, data, ec.ECDSA(hashes.SHA256()))
+        public_key = load_pem_public_key(public_key)
+        public_key.verify(signature, digest, ec.ECDSA(Prehashed(hashes.SHA256())))
     except InvalidSignature:
         print("Signature is invalid")
-        raise InvalidSignature
-    except Exception as e:
+        raise
+    except (TypeError, ValueError, AttributeError) as e:
         print("Exception in verifying artifact signature:", e)
+        raise InvalidSignature from e
+
+
+# verifies an ECDSA signature over an artifact file, raises InvalidSignature
+# if it does not match
+def verify_artifact_signature(signature, public_key, artifact_filename):
+    verify_artifact_digest(signature, public_key, digest_artifact(artifact_filename))
@@ -0,0 +1,88 @@
+"""Cheap matching of rekor log entries against a watchlist of identities
+
+Parsing an x509 certificate for every entry is too slow to keep up with the
+log, so entries are first matched on the raw bytes of their certificate. The
+SAN email or URI of a fulcio certificate is stored as plain ASCII in the DER,
+so an entry whose DER does not contain any watched identity cannot match.
+Only the candidates are parsed, see util.extract_cert_identities.
+"""
+
+import base64
+import binascii
+import json
+import os
+import re
+
+PEM_BEGIN = b"-----BEGIN CERTIFICATE-----"
+PEM_END = b"-----END CERTIFICATE-----"
+
+
+def extract_cert_der(body):
+    """returns the DER certificate of an entry body (base64 string), None if
+    the entry holds no certificate
+    """
+    try:
+        entry = json.loads(base64.b64decode(body))
+        content = entry["spec"]["signature"]["publicKey"]["content"]
+        pem = base64.b64decode(content)
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None
+
+    start = pem.find(PEM_BEGIN)
+    end = pem.find(PEM_END, start)
+    if start < 0 or end < 0:
+        return None
+
+    try:
+        # b64decode skips the line breaks of the PEM body
+        return base64.b64decode(pem[start + len(PEM_BEGIN) : end])
+    except binascii.Error:
+        return None
+
+
+class Watchlist:
+    def __init__(self, identities):
+        self.identities = {i.casefold() for i in identities}
+        if not self.identities:
+            raise ValueError("watchlist is empty")
+
+        # one compiled alternation scans the DER once in C for every identity
+        patterns = [re.escape(i.encode()) for i in sorted(self.identities)]
+        self._prefilter = re.compile(b"|".join(patterns), re.IGNORECASE)
+
+    def is_candidate(self, der):
+        """True if the certificate bytes contain a watched identity"""
+        return der is not None and self._prefilter.search(der) is not None
+
+    def matches(self, cert_identities):
+        """watched identities among the identities parsed from a certificate"""
+        return {i for i in cert_identities if i.casefold() in self.identities}
+
+
+class ScanOptions:
+    def __init__(self, start, end=None, state_path=None, workers=8):
+        # first log index to scan, if there is no saved position
+        self.start = start
+        # log index to stop before, None scans to the end of the log
+        self.end = end
+        # file the scan position is saved in, None keeps no position
+        self.state_path = state_path
+        # number of fetch threads, and of certificate parsing threads
+        self.workers = workers
+
+
+def load_scan_position(path, default):
+    """returns the next log index to scan saved in path, default if there is none"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return int(json.load(f)["nextIndex"])
+    except FileNotFoundError:
+        return default
+
+
+def save_scan_position(path, next_index):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"nextIndex": next_index}, f)
+    # a crash leaves either the old or the new position, never half a file
+    os.replace(tmp_path, path)
@@ -0,0 +1,304 @@
+"""Checkpoint witness for local monitors
+
+The witness follows the latest rekor checkpoint, verifies it is consistent
+with the head it persisted last time, cosigns it with a local key and serves
+it over HTTP. Local monitors fetch the cosigned checkpoint (with ETag based
+conditional GET) and only check the cosignature, instead of each of them
+polling rekor and verifying consistency on their own.
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from .merkle_proof import DefaultHasher, RootMismatchError, verify_consistency
+
+WITNESS_ORIGIN = "sscs-witness"
+# number of consistency proofs kept for clients that are behind
+PROOF_CACHE_SIZE = 256
+
+
+# loads the witness signing key, creating a new P-256 key on first use
+def load_or_create_key(key_path):
+    if os.path.exists(key_path):
+        with open(key_path, "rb") as key_file:
+            return serialization.load_pem_private_key(key_file.read(), password=None)
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as key_file:
+        key_file.write(pem)
+    return key
+
+
+# the bytes the witness signs for a checkpoint
+def cosigned_body(head):
+    return (
+        f"{WITNESS_ORIGIN}\n{head['treeID']}\n{head['treeSize']}\n"
+        f"{head['rootHash']}\n{head['timestamp']}\n"
+    ).encode()
+
+
+# verifies the cosignature of a checkpoint served by a witness, raises
+# InvalidSignature if it does not match the witness public key (PEM)
+def verify_cosignature(head, public_key):
+    public_key = serialization.load_pem_public_key(public_key)
+    signature = base64.b64decode(head["cosignature"])
+    public_key.verify(signature, cosigned_body(head), ec.ECDSA(hashes.SHA256()))
+
+
+class Witness:
+    def __init__(
+        self, key_path, state_path, get_checkpoint, get_consistency, debug=False
+    ):
+        """get_checkpoint() returns the latest checkpoint dict or False,
+        get_consistency(first_size, last_size, tree_id) returns the proof hashes or False
+        """
+        self.key = load_or_create_key(key_path)
+        self.state_path = state_path
+        self.get_checkpoint = get_checkpoint
+        self.get_consistency = get_consistency
+        self.debug = debug
+
+        self.lock = threading.Lock()
+        self.proofs = OrderedDict()
+        self.head = None
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as state_file:
+                self.head = json.load(state_file)
+
+    def public_key(self):
+        return self.key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+
+    def etag(self, head):
+        """ETag of a head, take it from the same head snapshot as the body
+        so a concurrent update() cannot pair a body with a newer tag
+        """
+        if head is None:
+            return None
+        return f'"{head["treeSize"]}-{head["rootHash"][:16]}"'
+
+    def _cache_proof(self, first_size, last_size, proof_hashes):
+        self.proofs[(first_size, last_size)] = proof_hashes
+        self.proofs.move_to_end((first_size, last_size))
+        while len(self.proofs) > PROOF_CACHE_SIZE:
+            self.proofs.popitem(last=False)
+
+    def _save(self, head):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as state_file:
+            json.dump(head, state_file, indent=4)
+        os.replace(tmp_path, self.state_path)
+
+    def update(self):
+        """fetches the latest checkpoint, verifies it against the persisted
+        head and cosigns it
+
+        Returns:
+            bool: returns False if the checkpoint could not be witnessed, else True
+        """
+        checkpoint = self.get_checkpoint()
+        if not checkpoint:
+            return False
+
+        old = self.head
+        proof_hashes = []
+        if old is not None:
+            if str(checkpoint["treeID"]) != str(old["treeID"]):
+                print(f"In witness: tree id changed to {checkpoint['treeID']}, not cosigning")
+                return False
+            if (
+                checkpoint["treeSize"] == old["treeSize"]
+                and checkpoint["rootHash"] == old["rootHash"]
+            ):
+                return True
+
+            if checkpoint["treeSize"] != old["treeSize"]:
+                proof_hashes = self.get_consistency(
+                    old["treeSize"], checkpoint["treeSize"], old["treeID"]
+                )
+                if proof_hashes is False:
+                    return False
+
+            try:
+                verify_consistency(
+                    DefaultHasher,
+                    old["treeSize"],
+                    checkpoint["treeSize"],
+                    proof_hashes,
+                    old["rootHash"],
+                    checkpoint["rootHash"],
+                )
+
+            except (ValueError, RootMismatchError) as error:
+                print(f"In witness: Failed to verify consistency with exception {error}")
+                return False
+
+        elif self.debug:
+            print("In witness: no persisted head, trusting the first checkpoint")
+
+        head = {
+            "treeID": str(checkpoint["treeID"]),
+            "treeSize": checkpoint["treeSize"],
+            "rootHash": checkpoint["rootHash"],
+            "signedTreeHead": checkpoint.get("signedTreeHead"),
+            "timestamp": int(time.time()),
+        }
+        signature = self.key.sign(cosigned_body(head), ec.ECDSA(hashes.SHA256()))
+        head["cosignature"] = base64.b64encode(signature).decode()
+
+        with self.lock:
+            if old is not None and old["treeSize"] != head["treeSize"]:
+                self._cache_proof(old["treeSize"], head["treeSize"], proof_hashes)
+            self._save(head)
+            self.head = head
+
+        if self.debug:
+            print(f"In witness: cosigned tree size {head['treeSize']}")
+        return True
+
+    def try_update(self):
+        """update() for the poller: network and parse errors are logged and
+        the current head is kept, so a failed poll does not stop polling
+
+        Returns:
+            bool: returns False if the checkpoint could not be witnessed, else True
+        """
+        try:
+            return self.update()
+
+        except (requests.RequestException, ValueError, KeyError) as error:
+            print(f"In witness: update failed, serving the last cosigned head - {error!r}")
+            return False
+
+    def proof(self, first_size):
+        """consistency proof from first_size to the witnessed head, served
+        from the cache when another client asked for it before
+        """
+        head = self.head
+        if head is None or not 0 < first_size <= head["treeSize"]:
+            return None
+
+        key = (first_size, head["treeSize"])
+        with self.lock:
+            proof_hashes = self.proofs.get(key)
+        if proof_hashes is None:
+            if first_size == head["treeSize"]:
+                proof_hashes = []
+            else:
+                proof_hashes = self.get_consistency(
+                    first_size, head["treeSize"], head["treeID"]
+                )
+                if proof_hashes is False:
+                    return None
+            with self.lock:
+                self._cache_proof(first_size, head["treeSize"], proof_hashes)
+
+        return {
+            "firstSize": first_size,
+            "lastSize": head["treeSize"],
+            "hashes": proof_hashes,
+        }
+
+
+def make_handler(witness):
+    class WitnessHandler(BaseHTTPRequestHandler):
+        def _send(
+            self, status, body=b"", content_type="application/json", etag=None
+        ):
+            self.send_response(status)
+            if etag:
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+            if body:
+                self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _not_modified(self, etag):
+            return etag is not None and etag in self.headers.get("If-None-Match", "")
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            url = urlparse(self.path)
+
+            if url.path == "/checkpoint":
+                head = witness.head
+                etag = witness.etag(head)
+                if head is None:
+                    self._send(503)
+                elif self._not_modified(etag):
+                    self._send(304, etag=etag)
+                else:
+                    self._send(200, json.dumps(head).encode(), etag=etag)
+
+            elif url.path == "/proof":
+                try:
+                    first_size = int(parse_qs(url.query)["firstSize"][0])
+                except (KeyError, ValueError):
+                    self._send(400)
+                    return
+
+                proof = witness.proof(first_size)
+                if proof is None:
+                    self._send(404)
+                    return
+                # a proof between two sizes never changes
+                etag = f'"{proof["firstSize"]}-{proof["lastSize"]}"'
+                if self._not_modified(etag):
+                    self._send(304, etag=etag)
+                else:
+                    self._send(200, json.dumps(proof).encode(), etag=etag)
+
+            elif url.path == "/public-key":
+                self._send(200, witness.public_key(), "application/x-pem-file")
+
+            else:
+                self._send(404)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            if witness.debug:
+                super().log_message(format, *args)
+
+    return WitnessHandler
+
+
+def serve(witness, host="127.0.0.1", port=8080, interval=60):
+    """serves the witness over HTTP and updates it every interval seconds,
+    runs until interrupted
+    """
+    stop = threading.Event()
+
+    def poll():
+        while not stop.is_set():
+            witness.try_update()
+            stop.wait(interval)
+
+    poller = threading.Thread(target=poll, daemon=True)
+    poller.start()
+
+    server = ThreadingHTTPServer((host, port), make_handler(witness))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
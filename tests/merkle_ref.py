@@ -0,0 +1,46 @@
+"""Reference RFC 6962 tree hashes and proofs over lists of leaf hashes"""
+
+from sscs_assn4.merkle_proof import DefaultHasher
+
+
+def leaves(n):
+    return [DefaultHasher.hash_leaf(str(i).encode()) for i in range(n)]
+
+
+def split(n):
+    # largest power of two smaller than n
+    k = 1
+    while k * 2 < n:
+        k *= 2
+    return k
+
+
+def mth(hashes):
+    # MTH(D[n])
+    if not hashes:
+        return DefaultHasher.empty_root()
+    if len(hashes) == 1:
+        return hashes[0]
+    k = split(len(hashes))
+    return DefaultHasher.hash_children(mth(hashes[:k]), mth(hashes[k:]))
+
+
+def inclusion_path(index, hashes):
+    # PATH(m, D[n])
+    if len(hashes) == 1:
+        return []
+    k = split(len(hashes))
+    if index < k:
+        return inclusion_path(index, hashes[:k]) + [mth(hashes[k:])]
+    return inclusion_path(index - k, hashes[k:]) + [mth(hashes[:k])]
+
+
+def consistency_path(m, hashes, whole=True):
+    # SUBPROOF(m, D[n], b)
+    n = len(hashes)
+    if m == n:
+        return [] if whole else [mth(hashes)]
+    k = split(n)
+    if m <= k:
+        return consistency_path(m, hashes[:k], whole) + [mth(hashes[k:])]
+    return consistency_path(m - k, hashes[k:], False) + [mth(hashes[:k])]
@@ -0,0 +1,64 @@
+"""Fake rekor entries signed with locally generated certificates"""
+
+import base64
+import datetime
+import json
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from sscs_assn4.merkle_proof import compute_leaf_hash
+
+
+def make_cert(key, email):
+    name = x509.Name([x509.NameAttribute(NameOID.ORGANIZATION_NAME, "sigstore.dev")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(minutes=10))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.RFC822Name(email)]), critical=False
+        )
+        .sign(key, hashes.SHA256())
+    )
+
+
+def make_body(email, signed_data=b""):
+    """base64 hashedrekord body with a cert for email, signing signed_data"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    pem = make_cert(key, email).public_bytes(serialization.Encoding.PEM)
+    signature = key.sign(signed_data, ec.ECDSA(hashes.SHA256()))
+    body = {
+        "kind": "hashedrekord",
+        "spec": {
+            "signature": {
+                "content": base64.b64encode(signature).decode(),
+                "publicKey": {"content": base64.b64encode(pem).decode()},
+            }
+        },
+    }
+    return base64.b64encode(json.dumps(body).encode()).decode()
+
+
+def make_entry(signed_data, email="alice@example.com"):
+    """log entry as returned by fetch_log_entry, alone in a tree of size 1"""
+    body = make_body(email, signed_data)
+    leaf_hash = compute_leaf_hash(body)
+    return {
+        "body": body,
+        "verification": {
+            "inclusionProof": {
+                "logIndex": 0,
+                "treeSize": 1,
+                "rootHash": leaf_hash,
+                "hashes": [],
+            }
+        },
+    }
@@ -0,0 +1,93 @@
+import pytest
+import requests
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+import sscs_assn4.__main__ as monitor
+from sscs_assn4.util import (
+    digest_artifact,
+    verify_artifact_digest,
+    verify_artifact_signature,
+)
+from tests.rekor_ref import make_entry
+
+
+def test_verify_artifact_digest(tmp_path):
+    artifact = tmp_path / "artifact.md"
+    artifact.write_bytes(b"hello rekor\n" * 1000)
+    key = ec.generate_private_key(ec.SECP256R1())
+    public_key = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+    signature = key.sign(artifact.read_bytes(), ec.ECDSA(hashes.SHA256()))
+    # small chunks so the digest is built from several reads
+    verify_artifact_digest(signature, public_key, digest_artifact(artifact, 7))
+    verify_artifact_signature(signature, public_key, artifact)
+
+    wrong = key.sign(b"something else", ec.ECDSA(hashes.SHA256()))
+    with pytest.raises(InvalidSignature):
+        verify_artifact_digest(wrong, public_key, digest_artifact(artifact))
+    with pytest.raises(InvalidSignature):
+        verify_artifact_digest(b"not der", public_key, digest_artifact(artifact))
+    with pytest.raises(InvalidSignature):
+        verify_artifact_signature(wrong, public_key, artifact)
+
+
+def test_inclusion_batch(tmp_path, monkeypatch):
+    items, entries = [], {}
+    for i in range(1, 6):
+        artifact = tmp_path / f"artifact{i}"
+        artifact.write_bytes(f"artifact {i}".encode())
+        # entry 3 is signed over different data
+        signed = b"tampered" if i == 3 else artifact.read_bytes()
+        entries[i] = make_entry(signed)
+        items.append((i, str(artifact)))
+    items.append((9, str(tmp_path / "artifact1")))
+    items.append((1, str(tmp_path / "missing")))
+
+    def fake_fetch(log_index, debug=False):
+        return entries.get(log_index, False)
+
+    monkeypatch.setattr(monitor, "fetch_log_entry", fake_fetch)
+
+    assert monitor.inclusion_batch(items) == [True, True, False, True, True, False, False]
+
+
+def test_inclusion_batch_fetch_errors(tmp_path, monkeypatch):
+    artifact = tmp_path / "artifact"
+    artifact.write_bytes(b"artifact")
+    no_proof = make_entry(artifact.read_bytes())
+    del no_proof["verification"]
+    entries = {i: make_entry(artifact.read_bytes()) for i in (1, 3)}
+    entries[4] = no_proof
+
+    def fake_fetch(log_index, debug=False):
+        if log_index == 2:
+            raise requests.ConnectionError("connection refused")
+        return entries[log_index]
+
+    monkeypatch.setattr(monitor, "fetch_log_entry", fake_fetch)
+
+    # a failed fetch or a missing proof only fails its own item
+    items = [(i, str(artifact)) for i in range(1, 5)]
+    assert monitor.inclusion_batch(items) == [True, False, True, False]
+    assert monitor.get_log_entry(1) == monitor.parse_log_entry(entries[1])
+
+
+def test_read_batch_file(tmp_path):
+    batch = tmp_path / "batch.txt"
+    batch.write_text("12 a.txt\n\n13 path with spaces.txt\n")
+    assert monitor.read_batch_file(str(batch)) == [
+        (12, "a.txt"),
+        (13, "path with spaces.txt"),
+    ]
+
+    batch.write_text("12 a.txt\n14\n")
+    assert monitor.read_batch_file(str(batch)) is False
+
+    batch.write_text("twelve a.txt\n")
+    assert monitor.read_batch_file(str(batch)) is False
+
+    assert monitor.read_batch_file(str(tmp_path / "missing.txt")) is False
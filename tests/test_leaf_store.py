@@ -0,0 +1,107 @@
+import hashlib
+import os
+import struct
+
+from sscs_assn4.leaf_store import LeafStore
+from sscs_assn4.merkle_proof import DefaultHasher, root_from_inclusion_proof
+from tests.merkle_ref import leaves, mth
+
+
+def test_leaf_store_lookup(tmp_path):
+    path = str(tmp_path / "leaves.bin")
+    data = leaves(3000)
+
+    with LeafStore(path) as store:
+        store.extend(data[:1500])
+        for d in data[1500:]:
+            store.append(d)
+
+        assert len(store) == 3000
+        assert store[1234] == data[1234]
+        assert store.index_of(data[2999]) == 2999
+        assert store.index_of(hashlib.sha256(b"missing").digest()) is None
+
+    # reopening only maps the files
+    with LeafStore(path, readonly=True) as store:
+        assert len(store) == 3000
+        assert store.index_of(data[17]) == 17
+
+
+def test_leaf_store_reader_sees_appends(tmp_path):
+    path = str(tmp_path / "leaves.bin")
+    data = leaves(2100)
+
+    with LeafStore(path) as writer:
+        writer.extend(data[:10])
+        with LeafStore(path, readonly=True) as reader:
+            assert len(reader) == 10
+            inode = os.stat(path + ".idx").st_ino
+            # grows the table past its first size while the reader has it mapped
+            writer.extend(data[10:])
+            # the table grew in place, nothing was swapped under the reader
+            assert os.stat(path + ".idx").st_ino == inode
+            assert reader.index_of(data[5]) == 5
+            assert reader.index_of(data[2000]) is None
+            reader.refresh()
+            assert len(reader) == 2100
+            assert reader.index_of(data[2000]) == 2000
+            assert reader[2099] == data[2099]
+
+
+def test_leaf_store_recovers_from_crash(tmp_path):
+    path = tmp_path / "leaves.bin"
+    data = leaves(5)
+
+    # crash before the header was written
+    path.write_bytes(b"")
+    with LeafStore(str(path)) as store:
+        assert len(store) == 0
+        store.extend(data[:3])
+
+    # crash in the middle of a record
+    with open(path, "ab") as f:
+        f.write(data[3][:10])
+    with LeafStore(str(path)) as store:
+        assert len(store) == 3
+        store.append(data[4])
+        assert store.index_of(data[4]) == 3
+        assert store[3] == data[4]
+
+
+def test_leaf_store_interrupted_rebuild(tmp_path):
+    path = str(tmp_path / "leaves.bin")
+    data = leaves(600)
+
+    with LeafStore(path) as store:
+        store.extend(data)
+
+    # a writer died in the middle of a rebuild, the generation is left odd
+    with open(path + ".idx", "r+b") as f:
+        f.seek(8)
+        (generation,) = struct.unpack("<Q", f.read(8))
+        f.seek(8)
+        f.write(struct.pack("<Q", generation | 1))
+
+    with LeafStore(path, readonly=True) as reader:
+        # readers do not trust the table and scan the leaves instead
+        assert reader.index_of(data[599]) == 599
+        with LeafStore(path) as writer:
+            assert writer.index_of(data[300]) == 300
+        assert reader.index_of(data[42]) == 42
+
+
+def test_leaf_store_roots_and_proofs(tmp_path):
+    path = str(tmp_path / "leaves.bin")
+    data = leaves(37)
+
+    with LeafStore(path) as store:
+        store.extend(data)
+        for size in (1, 2, 5, 16, 37):
+            root = store.root(size=size)
+            assert root == mth(data[:size])
+            for index in range(size):
+                proof = store.inclusion_proof(index, size)
+                calc = root_from_inclusion_proof(
+                    DefaultHasher, index, size, store[index], proof
+                )
+                assert calc == root
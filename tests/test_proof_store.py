@@ -0,0 +1,81 @@
+import json
+
+from sscs_assn4.proof_store import ProofStore
+from tests.merkle_ref import consistency_path, inclusion_path, leaves, mth
+
+
+def ver_map(index, size, data):
+    return {
+        "logIndex": index,
+        "treeSize": size,
+        "rootHash": mth(data[:size]).hex(),
+        "leafHash": data[index].hex(),
+        "hashes": [h.hex() for h in inclusion_path(index, data[:size])],
+    }
+
+
+def test_proof_store_advance():
+    data = leaves(40)
+
+    for size1 in range(1, 25):
+        for size2 in (size1, size1 + 1, 32, 40):
+            store = ProofStore()
+            for index in range(size1):
+                store.add(index, ver_map(index, size1, data))
+
+            calls = []
+
+            def get_consistency(first_size, size2=size2):
+                calls.append(first_size)
+                return [h.hex() for h in consistency_path(first_size, data[:size2])]
+
+            stale = store.advance(size2, mth(data[:size2]).hex(), get_consistency)
+
+            assert not stale
+            assert len(calls) == (0 if size1 == size2 else 1)
+            for index in range(size1):
+                assert store.proofs[index]["hashes"] == ver_map(index, size2, data)["hashes"]
+
+
+def test_proof_store_bad_consistency():
+    data = leaves(20)
+    store = ProofStore()
+    store.add(3, ver_map(3, 10, data))
+    store.add(7, ver_map(7, 10, data))
+
+    def get_consistency(first_size):
+        return [h.hex() for h in consistency_path(first_size, data[:17])]
+
+    # proof for 17 leaves does not lead to the root of 20 leaves
+    stale = store.advance(20, mth(data).hex(), get_consistency)
+
+    assert sorted(stale) == [3, 7]
+    assert store.proofs[3]["treeSize"] == 10
+
+
+def test_proof_store_load_drops_bad_entries(tmp_path):
+    data = leaves(10)
+    store = ProofStore()
+    store.add(2, ver_map(2, 10, data))
+    store.add(5, ver_map(5, 10, data))
+    path = str(tmp_path / "proofs.json")
+    store.save(path)
+
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    saved["5"]["hashes"][0] = "00" * 32
+    saved["7"] = {"logIndex": 7}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(saved, f)
+
+    loaded = ProofStore.load(path)
+    assert list(loaded.proofs) == [2]
+    assert loaded.stale == {5, 7}
+
+    # refetching a stale entry clears it
+    loaded.add(5, ver_map(5, 10, data))
+    assert loaded.stale == {7}
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    assert len(ProofStore.load(path)) == 0
@@ -0,0 +1,38 @@
+import base64
+import json
+
+import sscs_assn4.__main__ as monitor
+from sscs_assn4.util import extract_cert_identities
+from sscs_assn4.watchlist import ScanOptions, Watchlist, extract_cert_der
+from tests.rekor_ref import make_body
+
+
+def test_watchlist_prefilter():
+    watchlist = Watchlist(["Alice@example.com"])
+    der = extract_cert_der(make_body("alice@example.com"))
+
+    assert watchlist.is_candidate(der)
+    assert watchlist.matches(extract_cert_identities(der)) == {"alice@example.com"}
+    assert not watchlist.is_candidate(extract_cert_der(make_body("bob@example.com")))
+    assert extract_cert_der(base64.b64encode(b"{}").decode()) is None
+
+
+def test_scan_watchlist_resumes(tmp_path, monkeypatch):
+    bodies = {i: make_body(f"user{i % 7}@example.com") for i in range(1, 150)}
+
+    def fake_fetch(log_index, debug=False):
+        if log_index not in bodies:
+            return False
+        return {"body": bodies[log_index]}
+
+    monkeypatch.setattr(monitor, "fetch_log_entry", fake_fetch)
+    state = str(tmp_path / "scan.json")
+
+    alerts = monitor.scan_watchlist(["user3@example.com"], ScanOptions(1, 100, state))
+    assert [i for i, _ in alerts] == [i for i in range(1, 100) if i % 7 == 3]
+
+    # resumes at 100 and stops at the end of the log
+    alerts = monitor.scan_watchlist(["user3@example.com"], ScanOptions(1, None, state))
+    assert [i for i, _ in alerts] == [i for i in range(100, 150) if i % 7 == 3]
+    with open(state, encoding="utf-8") as f:
+        assert json.load(f)["nextIndex"] == 150
@@ -0,0 +1,143 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+from cryptography.exceptions import InvalidSignature
+
+import sscs_assn4.__main__ as monitor
+from sscs_assn4.witness import Witness, make_handler, verify_cosignature
+from tests.merkle_ref import consistency_path, leaves, mth
+
+DATA = leaves(30)
+
+
+def make_witness(tmp_path, head, fetched):
+    def get_checkpoint():
+        size = head["size"]
+        return {"treeID": "1", "treeSize": size, "rootHash": mth(DATA[:size]).hex()}
+
+    def get_consistency(first_size, last_size, tree_id):
+        fetched.append((first_size, last_size))
+        return [h.hex() for h in consistency_path(first_size, DATA[:last_size])]
+
+    return Witness(
+        str(tmp_path / "key.pem"),
+        str(tmp_path / "state.json"),
+        get_checkpoint,
+        get_consistency,
+    )
+
+
+def test_witness_update(tmp_path):
+    head, fetched = {"size": 10}, []
+    witness = make_witness(tmp_path, head, fetched)
+
+    assert witness.update()
+    verify_cosignature(witness.head, witness.public_key())
+
+    head["size"] = 25
+    assert witness.update()
+    assert witness.head["treeSize"] == 25
+    assert fetched == [(10, 25)]
+
+    # the proof checked by the witness is served from its cache
+    assert witness.proof(10)["hashes"]
+    assert fetched == [(10, 25)]
+
+    tampered = dict(witness.head, treeSize=26)
+    with pytest.raises(InvalidSignature):
+        verify_cosignature(tampered, witness.public_key())
+
+    # the persisted head survives a restart
+    restarted = make_witness(tmp_path, head, fetched)
+    assert restarted.head == witness.head
+
+
+def test_witness_conditional_get(tmp_path):
+    witness = make_witness(tmp_path, {"size": 12}, [])
+    witness.update()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(witness))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/checkpoint"
+
+    try:
+        with urllib.request.urlopen(url) as res:
+            etag = res.headers["ETag"]
+            assert json.load(res)["treeSize"] == 12
+
+        req = urllib.request.Request(url, headers={"If-None-Match": etag})
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(req)
+        assert error.value.code == 304
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_witness_survives_failed_poll(tmp_path):
+    head = {"size": 8}
+    witness = make_witness(tmp_path, head, [])
+    witness.update()
+    cosigned = witness.head
+
+    def unreachable():
+        raise requests.ConnectionError("rekor is down")
+
+    witness.get_checkpoint = unreachable
+    assert not witness.try_update()
+    assert witness.head == cosigned
+    assert witness.etag(cosigned) == f'"8-{cosigned["rootHash"][:16]}"'
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.status_code = 200
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def test_witnessed_checkpoint_client(tmp_path, monkeypatch):
+    head = {"size": 9}
+    witness = make_witness(tmp_path, head, [])
+    witness.update()
+    head["size"] = 27
+    witness.update()
+
+    pubkey = tmp_path / "witness.pub"
+    pubkey.write_bytes(witness.public_key())
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(witness))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    opts = (f"http://127.0.0.1:{server.server_address[1]}", str(pubkey))
+
+    try:
+        assert monitor.get_trusted_checkpoint(opts)["treeSize"] == 27
+        prev = {"treeID": "1", "treeSize": 9, "rootHash": mth(DATA[:9]).hex()}
+        assert monitor.consistency(prev, witness_opts=opts)
+        # a head of another tree fails before any proof is fetched
+        assert not monitor.consistency(dict(prev, treeID="2"), witness_opts=opts)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # the witness is down
+    assert monitor.get_witnessed_checkpoint(*opts) is False
+    assert monitor.get_witnessed_consistency_proof(opts[0], 9, witness.head) is False
+
+    good = json.dumps(witness.head)
+    bad_sig = json.dumps(dict(witness.head, cosignature="!!not base64!!"))
+    for body, key in [
+        ("not json", witness.public_key()),
+        (bad_sig, witness.public_key()),
+        (good, b"not a pem"),
+    ]:
+        pubkey.write_bytes(key)
+        monkeypatch.setattr(monitor.r, "get", lambda url, timeout, b=body: FakeResponse(b))
+        assert monitor.get_witnessed_checkpoint("http://witness", str(pubkey)) is False